@@ -7,7 +7,8 @@ import re
 from greencrawler import Crawler, CrawlingMode
 from sqlalchemy import Table, Index, UniqueConstraint, Column, ForeignKey
 from sqlalchemy import Integer, String
-from sqlalchemy import select, insert
+
+EMAIL_RE = re.compile(r'([\w.+-]+@[\w-]+(\.[\w-]+)*\.[a-zA-Z]{2,})')
 
 
 class EmailSeeker(Crawler):
@@ -28,33 +29,20 @@ class EmailSeeker(Crawler):
         )
         super()._define_db_tables()
 
-    def _check_email_exists(self, email: str) -> bool:
-        """Checks, if email already added."""
-        with self.engine.connect() as connection:
-            statement = (select(self.email_table)
-                    .where(self.email_table.c.token_id == self.token_id)
-                    .where(self.email_table.c.email == email)
-                    .limit(1))
-            email = connection.execute(statement).first()
-        return bool(email)
-
-    def _add_email(self, email: str, url: str) -> None:
-        """Insert new email into email_table."""
-        with self.engine.connect() as connection:
-            connection.execute(
-                insert(self.email_table).values(
-                    token_id=self.token_id,
-                    email=email,
-                    url=url))
-            connection.commit()
-
-    def custom_process_url(self, url: str, html: str) -> None:
+    async def _add_emails(self, emails: set[str], url: str) -> None:
+        """Insert new emails into email_table, skipping already added ones."""
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                self._insert_ignoring_duplicates(self.email_table),
+                [{"token_id": self.token_id,
+                  "email": email,
+                  "url": url} for email in emails])
+
+    async def custom_process_url(self, url: str, html: str) -> None:
         """Process content of the page."""
-        emails = re.findall(r'([\w.+-]+@[\w-]+(\.[\w-]+)*\.[a-zA-Z]{2,})', html)
-        for email, _ in emails:
-            email = email.lower()
-            if not self._check_email_exists(email):
-                self._add_email(email, url)
+        emails = {email.lower() for email, _ in EMAIL_RE.findall(html)}
+        if emails:
+            await self._add_emails(emails, url)
 
 
 if __name__ == '__main__':
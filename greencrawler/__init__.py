@@ -1,29 +1,129 @@
 """Implements Crawler class."""
 
+import inspect
 import re
 from datetime import datetime
-from typing import Any, Optional, final
+from functools import lru_cache, wraps
+from html import unescape
+from typing import Any, Callable, Optional, final
+from urllib.parse import SplitResult
 
 import asyncio
 import aiohttp
 
-from sqlalchemy import create_engine, Engine, Row
-from sqlalchemy import MetaData
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+from sqlalchemy import Row, Insert, Update
+from sqlalchemy import MetaData, event
 from sqlalchemy import Table, Index, UniqueConstraint, Column, ForeignKey
 from sqlalchemy import Integer, String, Enum, Boolean, DateTime
-from sqlalchemy import select, insert, update
-from sqlalchemy import func
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from .classes import CrawlingMode, TasksState, URLData
+from .classes import CrawlingMode, TasksState, URLData, HASH_LENGTH
 
 HTTP_VSTATUS_NO_RESPONSE = 0
 HTTP_VSTATUS_NOT_HTML = 13
+HTTP_REQUEST_TIMEOUT = 30
+
+_HREF_RE = re.compile(r'href=[\"\\\']+([^\"\\\']+)', re.IGNORECASE)
+_SKIPPED_HREF_PREFIXES = ("#", "javascript:", "mailto:", "tel:")
+_ABSOLUTE_URL_PREFIXES = ("http://", "https://")
+
+
+def _extract_hrefs(html: str) -> list[str]:
+    """Returns links found on web page.
+
+    Both ways return entity-decoded and stripped values, so the same link gets
+    the same hash whether selectolax is installed or not. The regex fallback
+    also picks up href attributes of elements other than <a> and <area>.
+    """
+    if LexborHTMLParser is None:
+        hrefs = (unescape(href).strip() for href in _HREF_RE.findall(html))
+    else:
+        hrefs = ((node.attributes.get("href") or "").strip()
+                 for node in LexborHTMLParser(html).css("a[href], area[href]"))
+    return [href for href in hrefs if href]
+
+
+@lru_cache(maxsize=65536)
+def _build_url_data(url: str, parent_details: Optional[SplitResult]) -> URLData:
+    """Returns parsed URL. Cached as the same links repeat on many pages."""
+    return URLData(url, parent_details)
+
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16384,
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,
+}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Tune SQLite connection for frequent small writes."""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _releasing_db_connections(method: Callable) -> Callable:
+    """Closes pooled database connections when public coroutine finishes.
+
+    Each aiosqlite connection runs in its own thread, and connections left in
+    the pool would keep the interpreter from exiting.
+    """
+    @wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            await self.engine.dispose()
+    return wrapper
 
 
 class CrawlerException(Exception):
     """Base class for exceptions used by Crawler."""
 
 
+def _check_forbidden_patterns(patterns: list[str]) -> list[str]:
+    """Returns patterns lowercased, checking that each of them still compiles."""
+    lower_patterns = []
+    for pattern in patterns:
+        lower_pattern = pattern.lower()
+        try:
+            re.compile(lower_pattern)
+        except re.error as error:
+            raise CrawlerException(f"Invalid regualr expression: {pattern}") from error
+        lower_patterns.append(lower_pattern)
+    return lower_patterns
+
+
+def _fuse_forbidden_patterns(patterns: list[str], template: str) -> Optional[re.Pattern]:
+    """Compiles patterns into one alternation put into template."""
+    if not patterns:
+        return None
+    fused = template.format("|".join(f"(?:{pattern})" for pattern in patterns))
+    try:
+        return re.compile(fused)
+    except re.error as error:
+        raise CrawlerException(
+            f"Regular expressions can not be combined: {', '.join(patterns)}") from error
+
+
 class Crawler:
     """Base class for web crawler."""
     number_of_tasks: int = 3
@@ -35,13 +135,25 @@ class Crawler:
     metadata_obj: MetaData = MetaData()
     token_table: Table
     url_table: Table
-    engine: Engine = create_engine("sqlite:///db.sqlite3")
+    _claim_url_statement: Update
+    _insert_urls_statement: Insert
+    _processed_url_statement: Update
+    engine: AsyncEngine = create_async_engine("sqlite+aiosqlite:///db.sqlite3",
+                                              poolclass=AsyncAdaptedQueuePool,
+                                              max_overflow=-1)
     _busy: bool = False
+    _http: aiohttp.ClientSession
+    _queue: asyncio.Queue
+    _seen_hashes: set[int]
+    _url_count: int = 0
+    _domain_ok: Optional[Callable[[str], bool]] = None
 
     _forbidden_domains: list[str] = []
     _forbidden_keywords: list[str] = []
-    _allowed_extensions: list[str] = ["htm", "html", "shtml", "asp", "aspx", "jsp",
-        "jspx", "php", "php5", "php4", "txt", ""]
+    _forbidden_domain_re: Optional[re.Pattern] = None
+    _forbidden_keyword_re: Optional[re.Pattern] = None
+    _allowed_extensions: frozenset[str] = frozenset(["htm", "html", "shtml", "asp", "aspx",
+        "jsp", "jspx", "php", "php5", "php4", "txt", ""])
 
 
     def __init__(self, *,
@@ -50,8 +162,12 @@ class Crawler:
         self.number_of_tasks = number_of_tasks
         self.tasks_state = TasksState(number_of_tasks)
         self.urls_limit = urls_limit
+        self._seen_hashes = set()
+        if (self.engine.dialect.name == "sqlite" and
+            not event.contains(self.engine.sync_engine, "connect", _set_sqlite_pragmas)):
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
         self._define_db_tables()
-        self.metadata_obj.create_all(self.engine)
+        self._define_db_statements()
 
     def _define_db_tables(self) -> None:
         """Define required database tables."""
@@ -67,29 +183,80 @@ class Crawler:
             "urls",
             self.metadata_obj,
             Column("id", Integer, primary_key=True, autoincrement=True),
-            Column("hash_id", String(63)),
+            Column("hash_id", String(HASH_LENGTH)),
             Column("token_id", ForeignKey("tokens.id")),
             Column("url", String(1023)),
             Column("status", Integer, nullable=True),
             Column("fetched", Boolean, default=False),
             Column("processed", Boolean, default=False),
             UniqueConstraint("token_id", "hash_id"),
-            Index("idx_token_hash", "token_id", "hash_id")
+            Index("idx_token_hash", "token_id", "hash_id"),
+            Index("idx_token_pending", "token_id", "id",
+                  sqlite_where=text("fetched IS 0 AND processed IS 0"))
         )
 
+    @final
+    def _define_db_statements(self) -> None:
+        """Build statements executed for every URL once."""
+        next_id = (select(self.url_table.c.id)
+                .where(self.url_table.c.token_id == bindparam("url_token_id"))
+                .where(self.url_table.c.processed.is_(False))
+                .where(self.url_table.c.fetched.is_(False))
+                .order_by(self.url_table.c.id)
+                .limit(1)
+                .scalar_subquery())
+        self._claim_url_statement = (update(self.url_table)
+                .where(self.url_table.c.id == next_id)
+                .values(fetched=True)
+                .returning(self.url_table))
+        self._insert_urls_statement = self._insert_ignoring_duplicates(self.url_table)
+        self._processed_url_statement = (update(self.url_table)
+                .where(self.url_table.c.id == bindparam("url_id"))
+                .values(processed=True, status=bindparam("url_status")))
+
+    @final
+    def _insert_ignoring_duplicates(self, table: Table) -> Insert:
+        """Returns INSERT into table which skips rows breaking unique constraints.
+
+        Supported for SQLite, PostgreSQL and MySQL engines, with other dialects
+        duplicate rows raise IntegrityError.
+        """
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(table).on_conflict_do_nothing()
+        if dialect == "postgresql":
+            return postgresql.insert(table).on_conflict_do_nothing()
+        if dialect in ("mysql", "mariadb"):
+            return insert(table).prefix_with("IGNORE")
+        return insert(table)
+
+    @final
+    def _build_domain_filter(self) -> Optional[Callable[[str], bool]]:
+        """Returns domain check for crawling mode, None if any domain is allowed."""
+        initial_domain = self.initial_url_data.domain
+        if self.crawling_mode == CrawlingMode.DOMAIN_ONLY:
+            return lambda domain: domain == initial_domain
+        if self.crawling_mode == CrawlingMode.DOMAIN_AND_SUBDOMAINS:
+            return lambda domain: domain.endswith(initial_domain)
+        return None
+
+    async def _create_db_tables(self) -> None:
+        """Create required database tables and indexes if they do not exist."""
+        async with self.engine.begin() as connection:
+            await connection.run_sync(self.metadata_obj.create_all)
+            for index in self.url_table.indexes:
+                await connection.run_sync(index.create, checkfirst=True)
+
     def get_forbidden_domains(self) -> list[str]:
         """Retruns list of forbidden domains."""
         return self._forbidden_domains
 
     def set_forbidden_domains(self, domains: list[str]) -> None:
         """Set list of forbidden domains. Use regular expressions to define domain."""
-        self._forbidden_domains = []
-        for domain in domains:
-            try:
-                re.compile(domain)
-            except re.error as error:
-                raise CrawlerException(f"Invalid regualr expression: {domain}") from error
-            self._forbidden_domains.append(domain.lower())
+        forbidden_domains = _check_forbidden_patterns(domains)
+        self._forbidden_domain_re = _fuse_forbidden_patterns(
+            forbidden_domains, r"^(?:[a-z0-9-]+\.)*(?:{})$")
+        self._forbidden_domains = forbidden_domains
 
     def get_forbidden_keywords(self) -> list[str]:
         """Retruns list of forbidden keywords."""
@@ -97,132 +264,128 @@ class Crawler:
 
     def set_forbidden_keywords(self, keywords: list[str]) -> None:
         """Set list of forbidden keywords. Use regular expressions to define keyword."""
-        self._forbidden_keywords = []
-        for keyword in keywords:
-            try:
-                re.compile(keyword)
-            except re.error as error:
-                raise CrawlerException(f"Invalid regualr expression: {keyword}") from error
-            self._forbidden_keywords.append(keyword.lower())
+        forbidden_keywords = _check_forbidden_patterns(keywords)
+        self._forbidden_keyword_re = _fuse_forbidden_patterns(forbidden_keywords, "{}")
+        self._forbidden_keywords = forbidden_keywords
 
     @final
-    def _get_next_url(self) -> Optional[Row[tuple]]:
-        """Returns next URL from url_table for given token."""
-        with self.engine.connect() as connection:
-            statement = (select(self.url_table)
-                    .where(self.url_table.c.token_id == self.token_id)
-                    .where(self.url_table.c.processed.is_(False))
-                    .where(self.url_table.c.fetched.is_(False))
-                    .order_by(self.url_table.c.id)
-                    .limit(1))
-            url = connection.execute(statement).first()
+    async def _claim_next_url(self) -> Optional[Row[tuple]]:
+        """Mark next URL of given token as fetched and return it."""
+        async with self.engine.begin() as connection:
+            url = (await connection.execute(
+                self._claim_url_statement, {"url_token_id": self.token_id})).first()
         return url
 
     @final
-    def _check_hash_exists(self, hash_id: str) -> bool:
-        """Checks if hash_id already exists."""
-        with self.engine.connect() as connection:
-            statement = (select(self.url_table)
+    async def _load_seen_hashes(self) -> None:
+        """Load hashes of all URLs known for given token."""
+        async with self.engine.begin() as connection:
+            statement = (select(self.url_table.c.id, self.url_table.c.url)
                     .where(self.url_table.c.token_id == self.token_id)
-                    .where(self.url_table.c.hash_id == hash_id)
-                    .limit(1))
-            url = connection.execute(statement).first()
-        return bool(url)
+                    .where(func.length(self.url_table.c.hash_id) != HASH_LENGTH))
+            migrated_urls = []
+            for url in (await connection.execute(statement)).all():
+                url_data = URLData(url.url)
+                # URLs accepted by older validation but rejected now keep their old hash.
+                if url_data:
+                    migrated_urls.append({"url_id": url.id, "new_hash_id": url_data.hash})
+            if migrated_urls:
+                await connection.execute(
+                    update(self.url_table)
+                    .where(self.url_table.c.id == bindparam("url_id"))
+                    .values(hash_id=bindparam("new_hash_id")),
+                    migrated_urls)
+            statement = (select(self.url_table.c.hash_id)
+                    .where(self.url_table.c.token_id == self.token_id))
+            self._seen_hashes = set(
+                int(hash_id, 16) for hash_id in (await connection.execute(statement)).scalars())
 
     @final
-    def _add_url(self, url_data: URLData) -> None:
-        """Insert new URL record into url_table."""
-        with self.engine.connect() as connection:
-            connection.execute(
-                insert(self.url_table).values(
-                    token_id=self.token_id,
-                    url=url_data.full_url,
-                    hash_id=url_data.hash))
-            connection.commit()
-
-    @final
-    def _set_url_as_fetched(self, url: Row[tuple]) -> None:
-        """Mark URL as fetched in database."""
-        with self.engine.connect() as connection:
-            connection.execute(
-                update(self.url_table)
-                .where(self.url_table.c.id == url.id)
-                .values(fetched=True))
-            connection.commit()
+    async def _add_urls(self, url_datas: list[URLData]) -> None:
+        """Insert new URL records into url_table in one statement."""
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                self._insert_urls_statement,
+                [{"token_id": self.token_id,
+                  "url": url_data.full_url,
+                  "hash_id": url_data.hash} for url_data in url_datas])
 
     @final
-    def _set_url_as_processed(self, url: Row[tuple], status: int) -> None:
+    async def _set_url_as_processed(self, url: Row[tuple], status: int) -> None:
         """Mark URL as processed in database."""
-        with self.engine.connect() as connection:
-            connection.execute(
-                update(self.url_table)
-                .where(self.url_table.c.id == url.id)
-                .values(processed=True, status=status))
-            connection.commit()
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                self._processed_url_statement, {"url_id": url.id, "url_status": status})
 
     @final
-    def _process_url(self, parent_url: str, html: str) -> None:
+    async def _process_url(self, parent_url: str, html: str) -> None:
         """Extract URLs from web page and put them into queue."""
-        regex = re.compile(r'href=[\"\\\']+([^\"\\\']+)', re.IGNORECASE)
-        urls = re.findall(regex, html)
-        with self.engine.connect() as connection:
-            statement = (select(func.count())
-                .select_from(self.url_table)
-                .where(self.url_table.c.token_id == self.token_id))
-            total_urls = connection.execute(statement).scalar()
-
+        parent_data = URLData(parent_url)
+        if not parent_data:
+            # Only URLs stored by older versions can be invalid, links can't be resolved.
+            await self._custom_process_url(parent_url, html)
+            return
+        urls = await asyncio.to_thread(_extract_hrefs, html)
+        parent_details = parent_data.details
+        domain_ok = self._domain_ok
+        allowed_extensions = self._allowed_extensions
+        forbidden_domain_re = self._forbidden_domain_re
+        forbidden_keyword_re = self._forbidden_keyword_re
+        seen_hashes = self._seen_hashes
+        candidates: dict[int, URLData] = {}
         for candidate_url in urls:
-            if self.urls_limit:
-                if total_urls >= self.urls_limit:
-                    break
-            if candidate_url.startswith("#"):
+            if candidate_url.startswith(_SKIPPED_HREF_PREFIXES):
                 continue
-            candidate_data = URLData(candidate_url, parent_url)
+            candidate_data = _build_url_data(
+                candidate_url,
+                None if candidate_url.startswith(_ABSOLUTE_URL_PREFIXES) else parent_details)
             if not bool(candidate_data):
                 continue
-            if self._check_hash_exists(candidate_data.hash):
-                continue
-            if (self.crawling_mode == CrawlingMode.DOMAIN_ONLY and
-                candidate_data.domain != self.initial_url_data.domain):
+            path = candidate_data.path
+            dot = path.rfind(".")
+            extension = (path[dot + 1:].lower()
+                         if dot >= 0 and len(path) - dot - 1 <= 5 else "")
+            if extension not in allowed_extensions:
                 continue
-            if (self.crawling_mode == CrawlingMode.DOMAIN_AND_SUBDOMAINS and
-                not candidate_data.domain.endswith(self.initial_url_data.domain)):
+            domain = candidate_data.domain
+            if domain_ok and not domain_ok(domain):
                 continue
-            domain_forbidden = False
-            for pattern in self._forbidden_domains:
-                regex = re.compile(rf"^([a-z0-9-]+\.)*({pattern})$", re.IGNORECASE)
-                if re.match(regex, candidate_data.domain):
-                    domain_forbidden = True
-                    break
-            if domain_forbidden:
+            fingerprint = candidate_data.hash_int
+            if fingerprint in candidates or fingerprint in seen_hashes:
                 continue
-            keyword_forbidden = False
-            for pattern in self._forbidden_keywords:
-                regex = re.compile(rf".*({pattern}).*", re.IGNORECASE)
-                if re.match(regex, candidate_data.full_url):
-                    keyword_forbidden = True
-                    break
-            if keyword_forbidden:
+            if forbidden_domain_re and forbidden_domain_re.match(domain):
                 continue
-            extension = ""
-            if "." in candidate_data.details.path:
-                extension = candidate_data.details.path.split(".")[-1].lower()
-                if len(extension) > 5:
-                    extension = ""
-            if extension not in self._allowed_extensions:
+            if (forbidden_keyword_re and
+                forbidden_keyword_re.search(candidate_data.lower_full_url)):
                 continue
 
-            total_urls += 1
-            self._add_url(candidate_data)
-        self.custom_process_url(parent_url, html)
+            candidates[fingerprint] = candidate_data
+
+        pending = list(candidates.values())
+        if self.urls_limit:
+            pending = pending[:max(self.urls_limit - self._url_count, 0)]
+        if pending:
+            self._seen_hashes.update(url_data.hash_int for url_data in pending)
+            self._url_count += len(pending)
+            await self._add_urls(pending)
+        await self._custom_process_url(parent_url, html)
 
-    def custom_process_url(self, url: str, html: str) -> None:
-        """Process content of the page."""
+    @final
+    async def _custom_process_url(self, url: str, html: str) -> None:
+        """Call custom_process_url, which may be overridden as plain method or coroutine."""
+        result = self.custom_process_url(url, html)
+        if inspect.isawaitable(result):
+            await result
+
+    async def custom_process_url(self, url: str, html: str) -> None:
+        """Process content of the page. Can be overridden as plain method too."""
 
-    def active_tokens(self) -> list[dict[str,Any]]:
+    @_releasing_db_connections
+    async def active_tokens(self) -> list[dict[str,Any]]:
         """Returns list of open tokens."""
+        await self._create_db_tables()
         tokens = []
-        with self.engine.connect() as connection:
+        async with self.engine.connect() as connection:
             total_urls_statement = (select(func.count().label("total_urls"),
                                            self.url_table.c.token_id)
                 .select_from(self.url_table)
@@ -244,7 +407,7 @@ class Crawler:
                         total_urls_statement,
                         total_urls_statement.c.token_id == self.token_table.c.id,
                         isouter=True))
-            rows = connection.execute(statement)
+            rows = await connection.execute(statement)
             tokens = [{
                 "id": r.id,
                 "url": r.url,
@@ -253,37 +416,49 @@ class Crawler:
                 "not_processed_urls": r.not_processed_urls}  for r in rows]
         return tokens
 
+    async def _producer(self) -> None:
+        """Put URLs waiting to be fetched into queue."""
+        while True:
+            # Idle state must be taken before the query: if no task is busy
+            # nobody can add new URLs while it runs, so empty result is final.
+            idle = self._queue.empty() and bool(self.tasks_state)
+            url = await self._claim_next_url()
+            if url:
+                await self._queue.put(url)
+            elif idle:
+                break
+            else:
+                await asyncio.sleep(0.1)
+        for _ in range(self.tasks_state.size):
+            await self._queue.put(None)
+
     async def task(self, task_idx):
         """Process token URL."""
         while True:
-            if bool(self.tasks_state):
+            self.tasks_state.set_free_task(task_idx)
+            url = await self._queue.get()
+            if url is None:
                 break
-            url = self._get_next_url()
-            if not url:
-                self.tasks_state.set_free_task(task_idx)
-                await asyncio.sleep(1)
-                continue
-            self.tasks_state.reset()
-            self._set_url_as_fetched(url)
+            self.tasks_state.set_busy_task(task_idx)
             status = 0
             html = ""
-            async with aiohttp.ClientSession() as aiohttp_session:
-                try:
-                    async with aiohttp_session.get(url.url) as response:
-                        if "text/html" in response.headers.get("Content-Type", ""):
-                            status = response.status
-                            html = await response.text()
-                        else:
-                            status = HTTP_VSTATUS_NOT_HTML
-                except aiohttp.ClientError:
-                    pass
-                except asyncio.TimeoutError:
-                    status = HTTP_VSTATUS_NO_RESPONSE
+            try:
+                async with self._http.get(url.url) as response:
+                    if "text/html" in response.headers.get("Content-Type", ""):
+                        status = response.status
+                        html = await response.text()
+                    else:
+                        status = HTTP_VSTATUS_NOT_HTML
+            except aiohttp.ClientError:
+                pass
+            except asyncio.TimeoutError:
+                status = HTTP_VSTATUS_NO_RESPONSE
             if html and (status >= 200 or status <= 299):
-                self._process_url(url.url, html)
-            self._set_url_as_processed(url, status)
+                await self._process_url(url.url, html)
+            await self._set_url_as_processed(url, status)
             print(f"{url.url} [status: {status}]")
 
+    @_releasing_db_connections
     async def start(self, *, initial_url: str,
                     crawling_mode: CrawlingMode = CrawlingMode.DOMAIN_ONLY) -> None:
         """Start crawling."""
@@ -296,23 +471,24 @@ class Crawler:
             raise CrawlerException("Valid initial URL required.")
         self.crawling_mode = crawling_mode
 
-        with self.engine.connect() as connection:
-            token_id = connection.execute(
+        await self._create_db_tables()
+        async with self.engine.begin() as connection:
+            token_id = (await connection.execute(
                 insert(self.token_table).values(
                     url=self.initial_url_data.full_url,
                     mode=self.crawling_mode,
                     created=datetime.utcnow()
-                )).inserted_primary_key.id
-            connection.execute(
+                ))).inserted_primary_key.id
+            await connection.execute(
                 insert(self.url_table).values(
                     token_id=token_id,
                     url=self.initial_url_data.full_url,
                     hash_id=self.initial_url_data.hash
                 ))
-            connection.commit()
 
         await self.resume(token_id=token_id)
 
+    @_releasing_db_connections
     async def resume(self, *, token_id: int) -> None:
         """Resume crawling."""
         if self._busy:
@@ -320,33 +496,50 @@ class Crawler:
             return
         if not token_id:
             raise CrawlerException("Requested token not found.")
-        
-        with self.engine.connect() as connection:
+
+        await self._create_db_tables()
+        async with self.engine.connect() as connection:
             statement = (select(self.token_table)
                          .where(self.token_table.c.id == token_id))
-            token = connection.execute(statement).first()
+            token = (await connection.execute(statement)).first()
             if not token:
                 raise CrawlerException("Requested token not found.")
-            connection.execute(update(self.url_table)
+            await connection.execute(update(self.url_table)
                 .where(self.url_table.c.token_id == token_id)
                 .where(self.url_table.c.processed.is_(False))
                 .where(self.url_table.c.fetched.is_(True))
                 .values(fetched=False))
-            connection.commit()
+            await connection.commit()
             statement = (select(self.token_table)
                 .join_from(self.token_table, self.url_table)
                 .where(self.token_table.c.id == token_id)
                 .where(self.url_table.c.processed.is_(False)))
-            token = connection.execute(statement).first()
+            token = (await connection.execute(statement)).first()
         if not token:
             print("Crawling finished!")
             return
 
         self.crawling_mode = token.mode
         self.initial_url_data = URLData(token.url)
+        self._domain_ok = self._build_domain_filter()
         self.token_id = token_id
+        await self._load_seen_hashes()
+        self._url_count = len(self._seen_hashes)
         self._busy = True
-        tasks = [self.task(idx) for idx in range(self.tasks_state.size)]
-        await asyncio.gather(*tasks)
-        self._busy = False
+        self._http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.number_of_tasks * 2,
+                limit_per_host=self.number_of_tasks,
+                resolver=aiohttp.AsyncResolver() if aiodns else None,
+                use_dns_cache=True,
+                ttl_dns_cache=600),
+            timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT))
+        self._queue = asyncio.Queue(maxsize=self.number_of_tasks * 2)
+        self.tasks_state.reset()
+        try:
+            tasks = [self.task(idx) for idx in range(self.tasks_state.size)]
+            await asyncio.gather(self._producer(), *tasks)
+        finally:
+            await self._http.close()
+            self._busy = False
         print("Crawling finished!")
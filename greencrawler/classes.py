@@ -1,11 +1,82 @@
 """Different helpers."""
 
-import hashlib
-import re
 from typing import Optional
 from enum import Enum
-from urllib.parse import ParseResult
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import SplitResult
+from urllib.parse import urlsplit, scheme_chars
+
+import xxhash
+
+HASH_LENGTH = 16
+_UNSET = object()
+_C0_CONTROL_OR_SPACE = "".join(map(chr, range(0x21)))
+_NO_DETAILS = SplitResult("", "", "", "", "")
+
+
+def _lower_if_needed(value: str) -> str:
+    """Returns lowercase value, reusing it when it is lowercase already."""
+    return value if value.islower() else value.lower()
+
+
+def _is_valid_host(host: str) -> bool:
+    """Checks if host is domain name, localhost or IPv4 address."""
+    if not host.isascii():
+        return False
+    if host.lower() == "localhost":
+        return True
+    labels = host.split(".")
+    if len(labels) == 4 and all(0 < len(label) <= 3 and label.isdigit() for label in labels):
+        return True
+    if host.endswith("."):
+        labels.pop()
+    tld = labels.pop()
+    if not labels or len(tld) < 2:
+        return False
+    tld = tld.replace("-", "")
+    if tld and not tld.isalnum():
+        return False
+    for label in labels:
+        if (not 0 < len(label) <= 63 or label[0] == "-" or label[-1] == "-" or
+            not label.replace("-", "").isalnum()):
+            return False
+    return True
+
+
+def _has_scheme(url: str) -> bool:
+    """Checks if url starts with scheme, the same way urllib.parse does.
+
+    As urlsplit, ignores leading C0 control characters and spaces and any
+    tab or newline characters.
+    """
+    url = url.lstrip(_C0_CONTROL_OR_SPACE)
+    if not url.isprintable():
+        url = url.replace("\t", "").replace("\r", "").replace("\n", "")
+    colon = url.find(":")
+    return (colon > 0 and url[0].isascii() and url[0].isalpha() and
+            not url[:colon].lstrip(scheme_chars))
+
+
+def _is_valid_http_url(url: str) -> bool:
+    """Checks if url is valid absolute http/https URL. Runs in linear time."""
+    scheme = url[:8].lower()
+    if scheme.startswith("http://"):
+        authority_start = 7
+    elif scheme == "https://":
+        authority_start = 8
+    else:
+        return False
+    authority_end = len(url)
+    for separator in "/?":
+        position = url.find(separator, authority_start, authority_end)
+        if position >= 0:
+            authority_end = position
+    host, colon, port = url[authority_start:authority_end].partition(":")
+    if colon and not (port.isascii() and port.isdigit()):
+        return False
+    if not _is_valid_host(host):
+        return False
+    tail = url[authority_end:]
+    return tail in ("", "/") or (len(tail) > 1 and tail.split(None, 1) == [tail])
 
 
 class CrawlingMode(Enum):
@@ -17,74 +88,79 @@ class CrawlingMode(Enum):
 
 class TasksState:
     """Keep the state of crawler tasks."""
-    tasks: list[bool]
+    __slots__ = ("tasks", "size", "_all_mask")
+    tasks: int
     size: int
 
     def __init__(self, number_of_tasks: int) -> None:
         self.size = number_of_tasks
+        self._all_mask = (1 << number_of_tasks) - 1
         self.reset()
 
     def set_free_task(self, task_id: int) -> None:
         """Mark task as free."""
-        self.tasks[task_id] = True
+        self.tasks |= 1 << task_id
+
+    def set_busy_task(self, task_id: int) -> None:
+        """Mark task as busy."""
+        self.tasks &= ~(1 << task_id)
 
     def reset(self) -> None:
         """Mark all tasks as busy."""
-        self.tasks = [False] * self.size
+        self.tasks = 0
 
     def __bool__(self):
         """Returns True if all tasks are free."""
-        return all(self.tasks)
+        return self.tasks == self._all_mask
 
 
 class URLData:
     """URL parser."""
+    __slots__ = ("original_url", "full_url", "details", "_hash", "_hash_int", "_lower_full_url",
+                 "_domain")
     original_url: str
-    full_url: str = None
-    details: ParseResult
-
-    def __init__(self, url: str, parent_url: str = None) -> None:
-        regex = re.compile(
-                r'^(?:http)s?://' # http:// or https://
-                r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|'
-                r'[A-Z0-9-]{2,}\.?)|' #domain...
-                r'localhost|' #localhost...
-                r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
-                r'(?::\d+)?' # optional port
-                r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+    full_url: Optional[str]
+    details: SplitResult
+
+    def __init__(self, url: str, parent_details: Optional[SplitResult] = None) -> None:
+        self._hash = _UNSET
+        self._hash_int = _UNSET
+        self._lower_full_url = None
+        self.details = _NO_DETAILS
+        self._domain = None
         self.original_url = url
-        self.full_url = url.split('#')[0]
-        self.details = urlparse(self.full_url)
-        if re.match(regex, self.full_url) is not None:
+        self.full_url = url.partition('#')[0]
+        if _is_valid_http_url(self.full_url):
+            self.details = urlsplit(self.full_url)
             return
-        if self.details.scheme or re.match(regex, parent_url) is None:
+        if not self.full_url or parent_details is None or _has_scheme(self.full_url):
             self.full_url = None
             return
 
-        parent_details = urlparse(parent_url)
-        if not url or url.startswith('#'):
-            self.full_url = None
-            return
-        if url.startswith('//'):
+        url = self.full_url
+        first = url[0]
+        if first == '/' and url[1:2] == '/':
+            # Protocol-relative link brings its own authority, so check it in full.
             self.full_url = f"{parent_details.scheme}:{url}"
-        elif url.startswith('/'):
-            self.full_url = f"{parent_details.scheme}://{parent_details.netloc}{url}"
-        elif url.startswith('?'):
-            self.full_url = (f"{parent_details.scheme}://{parent_details.netloc}"
-                             f"{parent_details.path if parent_details.path else '/'}"
-                             f"{url}")
+            if not _is_valid_http_url(self.full_url):
+                self.full_url = None
+                return
         else:
-            path_parts = parent_details.path.split('/')
-            path_parts[-1] = url
-            self.full_url = (f"{parent_details.scheme}://{parent_details.netloc}"
-                             f"{'/' if len(path_parts) == 1 else ''}"
-                             f"{'/'.join(path_parts)}")
-
-        self.full_url = self.full_url.split('#')[0]
-        if re.match(regex, self.full_url) is None:
-            self.full_url = None
-            return
-        self.details = urlparse(self.full_url)
+            # Authority comes from already validated parent, so only the
+            # appended part needs checking.
+            if url.split(None, 1) != [url]:
+                self.full_url = None
+                return
+            prefix = f"{parent_details.scheme}://{parent_details.netloc}"
+            path = parent_details.path
+            if first == '/':
+                self.full_url = prefix + url
+            elif first == '?':
+                self.full_url = prefix + (path if path else '/') + url
+            else:
+                slash = path.rfind('/')
+                self.full_url = prefix + (path[:slash + 1] if slash >= 0 else '/') + url
+        self.details = urlsplit(self.full_url)
 
     def __bool__(self) -> bool:
         """Returns True is URL is valid http/https URL."""
@@ -101,24 +177,63 @@ class URLData:
         return self.details.scheme.startswith('http')
 
     @property
-    def domain(self) -> str:
-        """Returns domain of the URL."""
-        return self.details.hostname
+    def path(self) -> str:
+        """Returns path of the URL without ';params' of its last segment, as urlparse does."""
+        path = self.details.path
+        semicolon = path.find(';', path.rfind('/') + 1)
+        return path if semicolon < 0 else path[:semicolon]
+
+    @property
+    def domain(self) -> Optional[str]:
+        """Returns domain of the URL (always lowercase)."""
+        if self._domain is None and self.full_url is not None:
+            self._domain = self.details.hostname
+        return self._domain
+
+    @property
+    def lower_full_url(self) -> Optional[str]:
+        """Returns lowercase full URL."""
+        if self._lower_full_url is None and self.full_url is not None:
+            self._lower_full_url = self.full_url.lower()
+        return self._lower_full_url
 
     @property
     def hash(self) -> Optional[str]:
-        """Returns hash of the URL."""
+        """Returns hash of the URL as hex string, as stored in database."""
+        if self._hash is _UNSET:
+            hash_int = self.hash_int
+            self._hash = None if hash_int is None else f"{hash_int:0{HASH_LENGTH}x}"
+        return self._hash
+
+    @property
+    def hash_int(self) -> Optional[int]:
+        """Returns hash of the URL as integer. Computed on first access."""
+        if self._hash_int is _UNSET:
+            self._hash_int = self._compute_hash()
+        return self._hash_int
+
+    def _compute_hash(self) -> Optional[int]:
+        """Computes hash of the URL."""
         if not self.is_http:
             return None
-        netloc = self.details.netloc.lower()
-        parsed_query = parse_qs(self.details.query)
-        query_parts = []
-        for key, value in sorted(parsed_query.items()):
-            query_parts.append(f"{key.lower()}={'#'.join(sorted(map(lambda s: s.lower(), value)))}")
+        details = self.details
+        netloc = _lower_if_needed(details.netloc).encode()
+        path = self.path
+        path = _lower_if_needed(path) if path else '/'
+        while '//' in path:
+            path = path.replace('//', '/')
+        query_values: dict[str, list[str]] = {}
+        for pair in details.query.split('&'):
+            key, _, value = pair.partition('=')
+            if value:
+                query_values.setdefault(key, []).append(value)
+        query_parts = [_lower_if_needed(key) + '='
+                       + '#'.join(sorted([_lower_if_needed(value) for value in values]))
+                       for key, values in sorted(query_values.items())]
         url_parts_for_hash = [
-            self.scheme,
-            netloc if not netloc.startswith("www.") else netloc[4:],
-            re.sub("//+", "/", self.details.path.lower()) if self.details.path else '/',
-            '&'.join(query_parts)
+            details.scheme.encode(),
+            netloc if not netloc.startswith(b"www.") else netloc[4:],
+            path.encode(),
+            '&'.join(query_parts).encode()
         ]
-        return hashlib.md5('>'.join(url_parts_for_hash).encode()).hexdigest()
+        return xxhash.xxh3_64_intdigest(b'>'.join(url_parts_for_hash))
@@ -0,0 +1,202 @@
+"""Checks URLData against the regex based implementation it replaced."""
+
+import random
+import re
+import unittest
+from urllib.parse import urlparse, urlsplit, parse_qs
+
+import xxhash
+
+from greencrawler.classes import URLData, _is_valid_http_url
+
+ORIGINAL_URL_RE = re.compile(
+        r'^(?:http)s?://' # http:// or https://
+        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+(?:[A-Z]{2,6}\.?|'
+        r'[A-Z0-9-]{2,}\.?)|' #domain...
+        r'localhost|' #localhost...
+        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})' # ...or ip
+        r'(?::\d+)?' # optional port
+        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+
+PARENT_URLS = ["http://example.com", "https://www.Example.com/a/b/c.html?x=1",
+               "http://localhost:8080/dir/", "http://10.0.0.1/p", "https://a-b.io/x/y;p"]
+PREFIXES = ["http://", "https://", "HTTPS://", "ftp://", "//", "/", "?", "", " ", "\x01",
+            "mailto:", "\tjavascript:", "java\nscript:", "C:\\", "#"]
+HOSTS = ["example.com", "sub.a-b.co.uk", "localhost", "10.0.0.1", "999.1.1.1", "1.2.3",
+         "-bad.com", "bad-.com", "x.c", "x.c0", "x.--", "a..com", "host.", "exa mple.com",
+         "xn--d1a.org", "caf\u00e9.com", "a" * 63 + ".com", "a" * 64 + ".com", "", "[::1]"]
+PORTS = ["", ":80", ":8a", ":", ":\u00b2"]
+TAILS = ["", "/", "/a/b", "?q=1", "/a b", "/p?x=1&y=2", "/\t", "/a\nb", "#frag", "/a#b c",
+         "?", "//x", "/.;x", "/\u00e9"]
+ALPHABET = "aZ09.-/?#:@ \t\x01%&=;\\\u00e9"
+
+
+def original_full_url(url: str, parent_url: str):
+    """Returns full URL the way the regex based URLData resolved it."""
+    full_url = url.split('#')[0]
+    if ORIGINAL_URL_RE.match(full_url):
+        return full_url
+    if urlparse(full_url).scheme or not url or url.startswith('#'):
+        return None
+    # URLData keeps ';params' in the path of the parent, urlparse used to drop them.
+    parent_details = urlsplit(parent_url)
+    if url.startswith('//'):
+        full_url = f"{parent_details.scheme}:{url}"
+    elif url.startswith('/'):
+        full_url = f"{parent_details.scheme}://{parent_details.netloc}{url}"
+    elif url.startswith('?'):
+        full_url = (f"{parent_details.scheme}://{parent_details.netloc}"
+                    f"{parent_details.path if parent_details.path else '/'}{url}")
+    else:
+        path_parts = parent_details.path.split('/')
+        path_parts[-1] = url
+        full_url = (f"{parent_details.scheme}://{parent_details.netloc}"
+                    f"{'/' if len(path_parts) == 1 else ''}{'/'.join(path_parts)}")
+    full_url = full_url.split('#')[0]
+    return full_url if ORIGINAL_URL_RE.match(full_url) else None
+
+
+def original_hash(full_url: str) -> str:
+    """Returns hash of the original payload, built with urlparse and parse_qs."""
+    details = urlparse(full_url)
+    netloc = details.netloc.lower()
+    query_parts = []
+    for key, value in sorted(parse_qs(details.query).items()):
+        query_parts.append(f"{key.lower()}={'#'.join(sorted(map(lambda s: s.lower(), value)))}")
+    url_parts_for_hash = [
+        details.scheme,
+        netloc if not netloc.startswith("www.") else netloc[4:],
+        re.sub("//+", "/", details.path.lower()) if details.path else '/',
+        '&'.join(query_parts)
+    ]
+    return xxhash.xxh3_64_hexdigest('>'.join(url_parts_for_hash).encode())
+
+
+def candidate_urls(count: int):
+    """Yields URLs built from known tricky parts, some of them mutated."""
+    rnd = random.Random(1)
+    for _ in range(count):
+        url = (rnd.choice(PREFIXES) + rnd.choice(HOSTS) + rnd.choice(PORTS) +
+               rnd.choice(TAILS))
+        for _ in range(rnd.randrange(3)):
+            position = rnd.randrange(len(url) + 1)
+            url = url[:position] + rnd.choice(ALPHABET) + url[position + 1:]
+        yield url
+
+
+class URLDataTest(unittest.TestCase):
+    """URLData tests."""
+
+    def test_validator_matches_original_regex(self):
+        """Linear validator accepts the same URLs as the original regex."""
+        for url in candidate_urls(20000):
+            if url.endswith("\n"):
+                continue
+            self.assertEqual(_is_valid_http_url(url), bool(ORIGINAL_URL_RE.match(url)), url)
+
+    def test_resolution_matches_original(self):
+        """Resolving links against parent gives the same full URLs as before."""
+        for parent_url in PARENT_URLS:
+            parent_details = URLData(parent_url).details
+            for url in candidate_urls(5000):
+                if url.split('#')[0].endswith("\n"):
+                    continue
+                try:
+                    expected = original_full_url(url, parent_url)
+                except ValueError:
+                    continue
+                self.assertEqual(URLData(url, parent_details).full_url, expected,
+                                 (url, parent_url))
+
+    def test_intended_differences(self):
+        """Cases where the original regex was too permissive."""
+        # "$" matched before a trailing newline.
+        self.assertFalse(_is_valid_http_url("http://example.com/page\n"))
+        # IGNORECASE let non-ASCII letters and digits match [A-Z] and \d.
+        self.assertFalse(_is_valid_http_url("http://\u0130stanbul.com/"))
+        self.assertFalse(_is_valid_http_url("http\u017f://example.com/"))
+        self.assertFalse(_is_valid_http_url("http://1.2.3.\u0663/"))
+        # Query-only links keep ';params' of the parent path.
+        self.assertEqual(URLData("?q=1", URLData("http://example.com/a;p").details).full_url,
+                         "http://example.com/a;p?q=1")
+
+    def test_params_ignored_like_urlparse(self):
+        """';params' of the last path segment are left out of hash and path."""
+        self.assertEqual(URLData("http://example.com/item.jsp;jsessionid=AAA").hash,
+                         URLData("http://example.com/item.jsp;jsessionid=BBB").hash)
+        self.assertEqual(URLData("http://example.com/item.jsp;jsessionid=AAA").hash,
+                         URLData("http://example.com/item.jsp").hash)
+        self.assertEqual(URLData("http://example.com/doc.pdf;jsessionid=X").path, "/doc.pdf")
+        self.assertEqual(URLData("http://example.com/a;b/c;d").path, "/a;b/c")
+        for url in candidate_urls(5000):
+            url_data = URLData(url)
+            if url_data:
+                self.assertEqual(url_data.path, urlparse(url_data.full_url).path, url)
+
+    def test_hash_golden_values(self):
+        """Hashes stored in database stay the same."""
+        golden = {
+            "http://example.com/": "4b0fa6bc98d7c912",
+            "https://example.com/": "8c01629ca1469087",
+            "http://example.com:8080/": "acea489d2179ef9c",
+            "http://example.com/Path/Page.html": "43dfd532eff2dffa",
+            "http://example.com/s": "1bcb1e882d734e64",
+            "http://example.com/s?a=1&b=2": "0d7e89b58df12936",
+            "http://example.com/s?a=1&a=2": "0264178894bb42a8",
+            "http://example.com/item.jsp": "e4cfe1b0dfc6928e",
+        }
+        for url, url_hash in golden.items():
+            self.assertEqual(URLData(url).hash, url_hash, url)
+            self.assertEqual(URLData(url).hash_int, int(url_hash, 16), url)
+
+    def test_hash_canonicalization(self):
+        """Spellings of the same URL share one hash, different URLs do not."""
+        groups = [
+            # Case folding, "www." stripping, "//" collapse, fragment.
+            ["http://example.com/Path/Page.html", "http://EXAMPLE.com/path/page.HTML",
+             "http://www.example.com/path/page.html", "http://example.com//path///page.html",
+             "http://example.com/path/page.html#top"],
+            # Empty path.
+            ["http://example.com/", "http://example.com", "http://www.Example.com/"],
+            ["https://example.com/"],
+            # Query ordering and blank values.
+            ["http://example.com/s?b=2&a=1", "http://example.com/s?a=1&b=2",
+             "http://example.com/s?A=1&b=2&c=&d", "http://example.com/s?b=2&a=1&e="],
+            # Duplicate keys.
+            ["http://example.com/s?a=2&a=1", "http://example.com/s?a=1&a=2",
+             "http://example.com/s?a=2&a=1&a="],
+            ["http://example.com/s?a=X&a=1"],
+            ["http://example.com/s", "http://example.com/s?", "http://example.com/s?a=&b"],
+            ["http://example.com:8080/"],
+        ]
+        hashes = []
+        for group in groups:
+            group_hashes = {URLData(url).hash for url in group}
+            self.assertEqual(len(group_hashes), 1, group)
+            hashes.extend(group_hashes)
+        self.assertEqual(len(set(hashes)), len(groups))
+
+    def test_hash_matches_original_payload(self):
+        """Hash payload is built the same way as with urlparse and parse_qs."""
+        for parent_url in PARENT_URLS:
+            parent_details = URLData(parent_url).details
+            for url in candidate_urls(5000):
+                url_data = URLData(url, parent_details)
+                # parse_qs decoded percent-escapes and '+', the raw query is hashed now.
+                query = url_data.details.query
+                if not url_data or '%' in query or '+' in query:
+                    continue
+                self.assertEqual(url_data.hash, original_hash(url_data.full_url), url)
+
+    def test_invalid_url_has_no_details(self):
+        """Invalid URL can still be asked for its properties."""
+        url_data = URLData("http://example.com/page\n")
+        self.assertFalse(url_data)
+        self.assertFalse(url_data.is_http)
+        self.assertIsNone(url_data.domain)
+        self.assertIsNone(url_data.lower_full_url)
+        self.assertIsNone(url_data.hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
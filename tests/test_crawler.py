@@ -0,0 +1,112 @@
+"""Checks Crawler helpers that do not need network access."""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from typing import Optional
+
+from sqlalchemy import MetaData, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from greencrawler import Crawler, CrawlerException
+from greencrawler.classes import URLData
+
+
+def make_crawler(engine: Optional[AsyncEngine] = None) -> Crawler:
+    """Returns crawler with its own tables, as Crawler shares MetaData between instances."""
+    class TestCrawler(Crawler):
+        """Crawler with separate MetaData."""
+        metadata_obj = MetaData()
+    if engine is not None:
+        TestCrawler.engine = engine
+    return TestCrawler()
+
+
+class ForbiddenPatternsTest(unittest.TestCase):
+    """Forbidden domain and keyword patterns."""
+
+    def test_patterns_are_fused(self):
+        """Patterns are lowercased and matched as one expression."""
+        crawler = make_crawler()
+        crawler.set_forbidden_domains([r"Example\.com", r"bad\.org"])
+        crawler.set_forbidden_keywords(["wp-JSON", r"feed\b"])
+        self.assertEqual(crawler.get_forbidden_domains(), [r"example\.com", r"bad\.org"])
+        self.assertTrue(crawler._forbidden_domain_re.match("www.example.com"))
+        self.assertFalse(crawler._forbidden_domain_re.match("example.community"))
+        self.assertTrue(crawler._forbidden_keyword_re.search("http://a.com/wp-json/x"))
+        self.assertFalse(crawler._forbidden_keyword_re.search("http://a.com/feeds"))
+
+    def test_invalid_patterns_raise_crawler_exception(self):
+        """Patterns valid on their own but broken by lowercasing or fusion are rejected."""
+        crawler = make_crawler()
+        crawler.set_forbidden_keywords(["wp"])
+        for patterns in (["(?P<x>wp)", "(?P<x>feed)"], ["a", "(?i)b"], ["(unclosed"]):
+            with self.assertRaises(CrawlerException, msg=patterns):
+                crawler.set_forbidden_keywords(patterns)
+            with self.assertRaises(CrawlerException, msg=patterns):
+                crawler.set_forbidden_domains(patterns)
+        self.assertEqual(crawler.get_forbidden_keywords(), ["wp"])
+
+
+class DatabaseTest(unittest.IsolatedAsyncioTestCase):
+    """Crawler database access."""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'db.sqlite3')}")
+        self.crawler = make_crawler(self.engine)
+        await self.crawler._create_db_tables()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_md5_hashes_are_migrated(self):
+        """MD5 hashes of older versions are replaced, invalid URLs keep them."""
+        legacy_urls = ["http://example.com/", "http://example.com/a?b=1", "http://example.com/p\n"]
+        legacy_hashes = [hashlib.md5(url.encode()).hexdigest() for url in legacy_urls]
+        current_url = "http://example.com/c"
+        async with self.engine.begin() as connection:
+            token_id = (await connection.execute(
+                insert(self.crawler.token_table).values(url=legacy_urls[0])
+            )).inserted_primary_key.id
+            await connection.execute(insert(self.crawler.url_table), [
+                {"token_id": token_id, "url": url, "hash_id": url_hash}
+                for url, url_hash in zip(legacy_urls, legacy_hashes)
+            ] + [{"token_id": token_id, "url": current_url, "hash_id": URLData(current_url).hash}])
+
+        self.crawler.token_id = token_id
+        await self.crawler._load_seen_hashes()
+
+        async with self.engine.connect() as connection:
+            stored = dict((await connection.execute(
+                select(self.crawler.url_table.c.url, self.crawler.url_table.c.hash_id)
+            )).all())
+        self.assertEqual(stored, {
+            legacy_urls[0]: URLData(legacy_urls[0]).hash,
+            legacy_urls[1]: URLData(legacy_urls[1]).hash,
+            legacy_urls[2]: legacy_hashes[2],
+            current_url: URLData(current_url).hash,
+        })
+        self.assertEqual(self.crawler._seen_hashes,
+                         {int(url_hash, 16) for url_hash in stored.values()})
+        self.assertIn(URLData(legacy_urls[1]).hash_int, self.crawler._seen_hashes)
+
+
+    async def test_duplicate_urls_are_ignored(self):
+        """Inserting already stored URL is skipped instead of failing."""
+        self.crawler.token_id = 1
+        url_datas = [URLData("http://example.com/"), URLData("http://example.com/a")]
+        await self.crawler._add_urls(url_datas[:1])
+        await self.crawler._add_urls(url_datas)
+        async with self.engine.connect() as connection:
+            stored = (await connection.execute(
+                select(self.crawler.url_table.c.url).order_by(self.crawler.url_table.c.id)
+            )).scalars().all()
+        self.assertEqual(stored, [url_data.full_url for url_data in url_datas])
+
+
+if __name__ == '__main__':
+    unittest.main()